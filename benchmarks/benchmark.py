@@ -0,0 +1,282 @@
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+BASE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+for task in ["task_1", "task_2", "task_3"]:
+    sys.path.append(os.path.normpath(os.path.join(BASE_DIRECTORY, "..", task)))
+
+from corpus import SyntheticCorpus
+from crawler import parse_webpage_content
+import create_tokens
+from create_tokens import ensure_nltk_resources, prewarm, process_pages
+from inverted_index import (
+    InvertedIndex,
+    build_inverted_index,
+    load_inverted_index,
+    save_inverted_index,
+)
+from page_store import PageStoreWriter
+import search
+import search_predicates
+from utils import lemmatize_term
+
+DEFAULT_NUM_DOCUMENTS = 200
+DEFAULT_WORDS_PER_DOCUMENT = 500
+DEFAULT_OUTPUT_PATH = "results/benchmark.json"
+REPEATS = 5
+# fast scenarios (a query takes well under a millisecond) are repeated
+# until one sample takes at least this long and timer noise is small
+MIN_SAMPLE_SECONDS = 0.05
+# best time slower than baseline by this factor is reported as a regression,
+# the best time is the least affected by other processes on the machine
+REGRESSION_THRESHOLD = 1.2
+HASH_SEED = "0"
+
+
+def measure(
+    name: str,
+    func: Callable,
+    items: int,
+    repeats: int = REPEATS,
+    setup: Optional[Callable] = None,
+) -> dict:
+    """`setup` runs before every repeat and is not timed"""
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    result = {
+        "name": name,
+        "repeats": repeats,
+        "items": items,
+        "min": min(times),
+        "median": median,
+        "mean": statistics.mean(times),
+        "items_per_second": items / median if median > 0 else None,
+    }
+    print(f"{name}: min {min(times) * 1000:.2f} ms, {items} items")
+    return result
+
+
+def measure_loop(name: str, func: Callable, items: int) -> dict:
+    """
+    Measure func called in a loop, the loop size is the smallest power of two
+    that takes MIN_SAMPLE_SECONDS. `items` are processed by one call
+    """
+
+    def run(count: int) -> None:
+        for _ in range(count):
+            func()
+
+    count = 1
+    while True:
+        start = time.perf_counter()
+        run(count)
+        if time.perf_counter() - start >= MIN_SAMPLE_SECONDS:
+            break
+        count *= 2
+    return measure(name, lambda: run(count), items * count)
+
+
+def pick_query_terms(inverted_index: InvertedIndex) -> tuple[list[str], list[str]]:
+    """Frequent and rare lemmas that lemmatize to themselves"""
+    lemmas = sorted(
+        inverted_index.mapping,
+        key=lambda lemma: (-len(inverted_index.mapping[lemma]), lemma),
+    )
+    lemmas = [lemma for lemma in lemmas if lemmatize_term(lemma) == lemma]
+    frequent, rare = lemmas[:3], lemmas[len(lemmas) // 2 :][:2]
+    if len(frequent) < 3 or len(rare) < 2 or set(frequent) & set(rare):
+        raise ValueError(
+            f"Index has only {len(lemmas)} usable lemmas, queries need at least 5: "
+            "increase number of documents or words per document"
+        )
+    return frequent, rare
+
+
+def get_queries(frequent: list[str], rare: list[str]) -> dict[str, str]:
+    a, b, c = frequent
+    r1, r2 = rare
+    return {
+        "term": a,
+        "and": f"{a} AND {b}",
+        "or": f"{a} OR {b} OR {c}",
+        "not": f"NOT {a}",
+        "and_not_rare": f"{a} AND NOT {r1}",
+        "nested": f"({a} OR {r1}) AND NOT ({b} OR NOT {r2})",
+    }
+
+
+def run_benchmarks(num_documents: int, words_per_document: int) -> dict:
+    corpus = SyntheticCorpus(num_documents, words_per_document)
+    raw_pages = [corpus.document_html(i) for i in range(num_documents)]
+    results = []
+
+    # parse_webpage_content is the CPU part of the crawler
+    def parse_all():
+        return [
+            parse_webpage_content(page, "https://ru.wikipedia.org/wiki/Матроид")[0]
+            for page in raw_pages
+        ]
+
+    results.append(measure_loop("parse_webpage_content", parse_all, num_documents))
+    parsed_pages = parse_all()
+
+    prewarm()
+    with tempfile.TemporaryDirectory() as directory:
+        pages_directory = os.path.join(directory, "pages")
+        with PageStoreWriter(pages_directory) as page_store:
+            for page_id, page in enumerate(parsed_pages):
+                page_store.append(page_id, page)
+
+        # process_pages writes lemma files to results/ in the working directory
+        current_directory = os.getcwd()
+        os.chdir(directory)
+        try:
+            os.makedirs("results", exist_ok=True)
+
+            def process_all():
+                with redirect_stdout(io.StringIO()):
+                    process_pages(pages_directory)
+
+            # every repeat lemmatizes from scratch, otherwise only the first
+            # one would call pymorphy2 and the rest would read the cache
+            results.append(
+                measure(
+                    "process_pages",
+                    process_all,
+                    num_documents,
+                    setup=create_tokens._lemma_cache.clear,
+                )
+            )
+        finally:
+            os.chdir(current_directory)
+
+        lemma_directory = os.path.join(directory, "results")
+        results.append(
+            measure_loop(
+                "build_inverted_index",
+                lambda: build_inverted_index(lemma_directory),
+                num_documents,
+            )
+        )
+        inverted_index = build_inverted_index(lemma_directory)
+
+        index_path = os.path.join(directory, "inverted_index.json")
+        save_inverted_index(inverted_index, index_path)
+        results.append(
+            measure_loop(
+                "load_inverted_index",
+                lambda: load_inverted_index(index_path),
+                num_documents,
+            )
+        )
+
+    # query terms are lemmatized once while picking them,
+    # so query scenarios measure parsing and evaluation with a warm lemma cache
+    frequent, rare = pick_query_terms(inverted_index)
+    queries = get_queries(frequent, rare)
+    for module in [search, search_predicates]:
+        for shape, query in queries.items():
+
+            results.append(
+                measure_loop(
+                    f"{module.__name__}.boolean_search[{shape}]",
+                    lambda module=module, query=query: module.boolean_search(
+                        query, inverted_index
+                    ),
+                    1,
+                )
+            )
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "hash_seed": os.environ.get("PYTHONHASHSEED"),
+            "platform": platform.platform(),
+            "num_documents": num_documents,
+            "words_per_document": words_per_document,
+            "vocabulary_size": len(corpus.vocabulary),
+            "index_terms": len(inverted_index.mapping),
+            "queries": queries,
+        },
+        "results": results,
+    }
+
+
+def compare_results(current: dict, baseline: dict) -> list[str]:
+    """
+    Print ratios of best times to baseline and return names of regressed scenarios.
+    Query scenarios are compared per query, loop sizes of two runs may differ
+    """
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        baseline_result = baseline_results.get(result["name"])
+        if not baseline_result or not baseline_result["min"]:
+            continue
+        ratio = (result["min"] / result["items"]) / (
+            baseline_result["min"] / baseline_result["items"]
+        )
+        mark = ""
+        if ratio > REGRESSION_THRESHOLD:
+            mark = " REGRESSION"
+            regressions.append(result["name"])
+        print(f"{result['name']}: x{ratio:.2f} to baseline{mark}")
+    return regressions
+
+
+if __name__ == "__main__":
+    if os.environ.get("PYTHONHASHSEED") != HASH_SEED:
+        # set and dict order of strings depends on the hash seed and changes
+        # query times by up to 1.5x between runs, restart with a fixed one
+        os.environ["PYTHONHASHSEED"] = HASH_SEED
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    num_documents = DEFAULT_NUM_DOCUMENTS
+    words_per_document = DEFAULT_WORDS_PER_DOCUMENT
+    output_path = DEFAULT_OUTPUT_PATH
+    baseline_path: Optional[str] = None
+    if len(sys.argv) > 5:
+        print("Error, too many args")
+        exit(1)
+    args = sys.argv[1:] + ["-"] * (4 - len(sys.argv[1:]))
+    if args[0] != "-":
+        num_documents = int(args[0])
+    if args[1] != "-":
+        words_per_document = int(args[1])
+    if args[2] != "-":
+        output_path = args[2]
+    if args[3] != "-":
+        baseline_path = args[3]
+
+    ensure_nltk_resources()
+    try:
+        report = run_benchmarks(num_documents, words_per_document)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w+") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print("Saved results to", output_path)
+
+    if baseline_path is not None:
+        with open(baseline_path, "r") as f:
+            baseline = json.load(f)
+        if compare_results(report, baseline):
+            exit(1)
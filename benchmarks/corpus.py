@@ -0,0 +1,82 @@
+from itertools import accumulate
+import random
+from typing import List
+
+# pseudo-Russian words are built from syllables and endings, so pymorphy2
+# analyzes them like unknown words of a real text
+SYLLABLES = [
+    "ма", "тро", "ид", "гра", "фа", "ли", "не", "ко", "ре", "ше", "ни", "ва",
+    "по", "ле", "ба", "зи", "сы", "мно", "же", "ство", "ал", "ге", "бра", "ви",
+    "ку", "ро", "де", "ту", "пла", "ска", "ры", "чи", "сло", "вер", "ши", "на",
+]
+ENDINGS = ["", "а", "ы", "ов", "ой", "ами", "ах", "ый", "ого", "ение", "ия", "ать"]
+STOP_WORDS = ["и", "в", "на", "не", "что", "по", "как", "из", "для", "это"]
+
+
+def generate_vocabulary(size: int, rng: random.Random) -> List[str]:
+    vocabulary = []
+    seen = set()
+    while len(vocabulary) < size:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        word = stem + rng.choice(ENDINGS)
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+
+class SyntheticCorpus:
+    """
+    Deterministic corpus of Wikipedia-like pages.
+    Word frequencies follow Zipf's law: word of rank r has weight 1 / r^s
+    """
+
+    def __init__(
+        self,
+        num_documents: int = 200,
+        words_per_document: int = 500,
+        vocabulary_size: int = 5000,
+        zipf_exponent: float = 1.1,
+        seed: int = 42,
+    ):
+        self.num_documents = num_documents
+        self.words_per_document = words_per_document
+        self.seed = seed
+        rng = random.Random(seed)
+        self.vocabulary = generate_vocabulary(vocabulary_size, rng)
+        self.cum_weights = list(
+            accumulate(1 / rank**zipf_exponent for rank in range(1, vocabulary_size + 1))
+        )
+
+    def document_words(self, document_id: int) -> List[str]:
+        rng = random.Random(self.seed * 1_000_003 + document_id)
+        words = rng.choices(
+            self.vocabulary, cum_weights=self.cum_weights, k=self.words_per_document
+        )
+        # stop words and numbers are mixed in to be filtered by the tokenizer
+        for i in range(0, len(words), 10):
+            words[i] = rng.choice(STOP_WORDS + ["2024", "xml"])
+        return words
+
+    def document_html(self, document_id: int) -> str:
+        """Full page as downloaded, with parts that parse_webpage_content removes"""
+        rng = random.Random(self.seed * 7_919 + document_id)
+        words = self.document_words(document_id)
+        paragraphs = []
+        for start in range(0, len(words), 50):
+            paragraph = " ".join(words[start : start + 50])
+            link_target = rng.randrange(self.num_documents)
+            paragraphs.append(
+                f'<p>{paragraph} <a href="/wiki/Страница_{link_target}">ссылка</a></p>'
+            )
+        body = "\n".join(paragraphs)
+        return (
+            "<html><head><style>p {color: black}</style></head><body>"
+            '<div id="bodyContent">'
+            f'<h2>Раздел {document_id}<span class="mw-editsection">править</span></h2>'
+            '<div id="toc">Содержание</div>'
+            f"{body}"
+            '<script>var x = 1;</script><img src="a.png">'
+            '<div id="catlinks">Категории</div>'
+            "</div></body></html>"
+        )
@@ -1,7 +1,7 @@
 from collections import deque
 import sys
 import logging
-from typing import Optional, Tuple, List, Set
+from typing import Dict, Optional, Tuple, List, Set
 import time
 import os
 
@@ -9,6 +9,11 @@ from bs4 import BeautifulSoup
 import requests
 from urllib.parse import urljoin, unquote, urlparse
 
+from dedup import NearDuplicateDetector
+import metrics
+from page_store import PageStoreWriter
+from validators import ValidatorCache
+
 
 DEFAULT_STARTING_URL = "https://ru.wikipedia.org/wiki/Матроид"
 DEFAULT_MAX_PAGES = 100
@@ -17,16 +22,38 @@ SLEEP_TIME = 2
 logger = logging.getLogger("__main__")
 
 
-def get_page_content(url: str) -> Optional[str]:
+def fetch_page(
+    url: str, headers: Optional[Dict[str, str]] = None
+) -> Optional[requests.Response]:
     logger.info("Requesting %s", url)
-    response = requests.get(url)
+    with metrics.timer("crawler_fetch_seconds"):
+        response = requests.get(url, headers=headers)
+    metrics.increment("crawler_fetched_bytes", len(response.content))
     if not response.ok:
+        metrics.increment("crawler_fetch_errors")
         logger.warning("Could not make request to %s", url)
         return None
+    return response
+
+
+def get_page_content(url: str) -> Optional[str]:
+    response = fetch_page(url)
+    if response is None:
+        return None
     return response.text
 
 
-def parse_webpage_content(content: str, original_url: str) -> Tuple[str, Set[str]]:
+def parse_webpage_content(
+    content: str, original_url: str
+) -> Tuple[str, str, Set[str]]:
+    """Returns cleaned html, its text and links to other pages"""
+    with metrics.timer("crawler_parse_seconds"):
+        return _parse_webpage_content(content, original_url)
+
+
+def _parse_webpage_content(
+    content: str, original_url: str
+) -> Tuple[str, str, Set[str]]:
     soup = BeautifulSoup(content, "html.parser")
 
     body = soup.find(
@@ -93,13 +120,11 @@ def parse_webpage_content(content: str, original_url: str) -> Tuple[str, Set[str
 
         links.add(full_url)
 
-    return body.prettify(), links
+    return body.prettify(), body.get_text(separator=" ", strip=True), links
 
 
-def save_webpage(content: str, page_id: int) -> None:
-    file_path = f"results/pages/{page_id}.html"
-    with open(file_path, "w+") as f:
-        f.write(content)
+def save_webpage(content: str, page_id: int, page_store: PageStoreWriter) -> None:
+    page_store.append(page_id, content)
 
 
 def save_index(index: List[str]) -> None:
@@ -108,6 +133,12 @@ def save_index(index: List[str]) -> None:
             f.write(f"{i} {url}\n")
 
 
+def save_duplicates(duplicates: List[Tuple[str, int]]) -> None:
+    with open("results/duplicates.txt", "w+") as f:
+        for url, canonical_id in duplicates:
+            f.write(f"{canonical_id} {url}\n")
+
+
 def main():
     logging.basicConfig(level=logging.INFO)
     starting_url = DEFAULT_STARTING_URL
@@ -137,27 +168,51 @@ def main():
     # page urls
     index: List[str] = []
     visited_urls = set()
+    page_store = PageStoreWriter("results/pages")
+    validator_cache = ValidatorCache()
+    duplicate_detector = NearDuplicateDetector()
+    # (url, id of the page it duplicates)
+    duplicates: List[Tuple[str, int]] = []
 
     while urls and len(index) < max_pages:
         url = unquote(urls.popleft())
         if url in visited_urls:
             continue
-        content = get_page_content(url)
-        if content is None:
+        response = fetch_page(url)
+        if response is None:
             continue
-        text, new_urls = parse_webpage_content(content, original_url=starting_url)
+        text, page_text, new_urls = parse_webpage_content(
+            response.text, original_url=starting_url
+        )
         visited_urls.add(url)
 
         urls.extend(new_urls)
 
         page_id = len(index)
-        save_webpage(text, page_id=page_id)
+        canonical_id = duplicate_detector.check(page_id, page_text)
+        if canonical_id is not None:
+            duplicates.append((url, canonical_id))
+            metrics.increment("crawler_duplicates")
+            logger.info("Skipping %s: near-duplicate of page %d", url, canonical_id)
+            time.sleep(SLEEP_TIME)
+            continue
+
+        save_webpage(text, page_id=page_id, page_store=page_store)
+        validator_cache.update(url, page_id, response, text)
         index.append(url)
 
         logger.info("%d) Parsed %s; sleeping %d seconds", page_id, url, SLEEP_TIME)
         time.sleep(SLEEP_TIME)
 
+    page_store.close()
     save_index(index)
+    validator_cache.save()
+    save_duplicates(duplicates)
+    logger.info(
+        "Skipped %d near-duplicates (%.1f%% of fetched pages)",
+        len(duplicates),
+        duplicate_detector.duplicate_ratio * 100,
+    )
     logger.info("Saved index. Finished crawling")
 
 
@@ -0,0 +1,109 @@
+from typing import Dict, List, Optional
+import hashlib
+import re
+
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# Pages with at most MAX_DISTANCE different bits are near-duplicates.
+# With MAX_DISTANCE + 1 bands at least one band of a duplicate matches exactly
+MAX_DISTANCE = 3
+
+
+def get_shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    words = re.findall(r"\w+", text.lower())
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> Optional[int]:
+    """Returns None for text shorter than one shingle, it is too short to compare"""
+    shingles = get_shingles(text)
+    if not shingles:
+        return None
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        shingle_hash = int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        for bit in range(SIMHASH_BITS):
+            if shingle_hash >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+
+    fingerprint = 0
+    for bit in range(SIMHASH_BITS):
+        if weights[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateDetector:
+    """
+    SimHash fingerprints with LSH banding: a fingerprint is split into bands,
+    only pages sharing a band are compared, so lookup does not scan all pages
+    """
+
+    def __init__(self, max_distance: int = MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.num_bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.num_bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.fingerprints: Dict[int, int] = {}
+        self.buckets: List[Dict[int, List[int]]] = [
+            {} for _ in range(self.num_bands)
+        ]
+        self.checked = 0
+        self.duplicates = 0
+
+    def _bands(self, fingerprint: int) -> List[int]:
+        return [
+            fingerprint >> (band * self.band_bits) & self.band_mask
+            for band in range(self.num_bands)
+        ]
+
+    def find_duplicate(self, fingerprint: int) -> Optional[int]:
+        """Return id of a stored page close to the fingerprint, if any"""
+        for band, value in enumerate(self._bands(fingerprint)):
+            for page_id in self.buckets[band].get(value, []):
+                distance = hamming_distance(fingerprint, self.fingerprints[page_id])
+                if distance <= self.max_distance:
+                    return page_id
+        return None
+
+    def add(self, page_id: int, fingerprint: int) -> None:
+        self.fingerprints[page_id] = fingerprint
+        for band, value in enumerate(self._bands(fingerprint)):
+            self.buckets[band].setdefault(value, []).append(page_id)
+
+    def check(self, page_id: int, text: str) -> Optional[int]:
+        """
+        Return canonical page id if text is a near-duplicate,
+        otherwise remember the page under page_id and return None.
+        Empty and very short pages are never considered duplicates
+        """
+        return self.check_fingerprint(page_id, simhash(text))
+
+    def check_fingerprint(
+        self, page_id: int, fingerprint: Optional[int]
+    ) -> Optional[int]:
+        """Same as `check` for a fingerprint computed elsewhere, e.g. in a worker"""
+        self.checked += 1
+        if fingerprint is None:
+            return None
+        canonical_id = self.find_duplicate(fingerprint)
+        if canonical_id is not None:
+            self.duplicates += 1
+            return canonical_id
+        self.add(page_id, fingerprint)
+        return None
+
+    @property
+    def duplicate_ratio(self) -> float:
+        if self.checked == 0:
+            return 0.0
+        return self.duplicates / self.checked
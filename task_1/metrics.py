@@ -0,0 +1,298 @@
+"""
+Lightweight timers and counters for crawler, tokenizer and search.
+
+Disabled by default: `timer` returns a shared no-op object and `increment`
+returns right away. Configured by environment variables:
+- OIP_METRICS=1 — collect metrics;
+- OIP_METRICS_EXPORT=path — write snapshots every OIP_METRICS_INTERVAL seconds
+  (default 10) and at exit, Prometheus text if path ends with .prom, else JSON;
+- OIP_PROFILE=path — run cProfile for the whole process and dump stats at exit.
+
+Forked workers start with empty metrics. They send `collect()` results
+to the parent with their answers, and the parent adds them with `merge()`.
+Gauges of different workers are kept apart by labels, e.g. `index_terms{shard="0"}`.
+"""
+
+from collections import Counter
+from typing import Dict, Optional
+import atexit
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+
+PREFIX = "oip_"
+
+_enabled = False
+_lock = threading.Lock()
+# exporter thread and the final export at exit write the same files
+_export_lock = threading.Lock()
+_start_time = time.time()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+# name -> [count, total seconds, max seconds]
+_timers: Dict[str, list] = {}
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    global _start_time
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timers.clear()
+        _start_time = time.time()
+
+
+def _after_fork_in_child() -> None:
+    global _lock, _export_lock
+    # locks could be held by a thread of the parent that does not exist here
+    _lock = threading.Lock()
+    _export_lock = threading.Lock()
+    # parent metrics stay in the parent, the child collects only its own
+    reset()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def increment(name: str, value: float = 1) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        stats = _timers.get(name)
+        if stats is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str):
+    """Context manager that records duration of the block under `name`"""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def _snapshot() -> dict:
+    return {
+        "timestamp": time.time(),
+        "uptime_seconds": time.time() - _start_time,
+        "counters": dict(_counters),
+        "gauges": dict(_gauges),
+        "timers": {
+            name: {"count": count, "total": total, "max": max_seconds}
+            for name, (count, total, max_seconds) in _timers.items()
+        },
+    }
+
+
+def snapshot() -> dict:
+    with _lock:
+        return _snapshot()
+
+
+def collect() -> Optional[dict]:
+    """
+    Snapshot and clear metrics, used by workers to send
+    what they measured since the previous call to the parent process
+    """
+    if not _enabled:
+        return None
+    with _lock:
+        data = _snapshot()
+        _counters.clear()
+        _gauges.clear()
+        _timers.clear()
+    return data
+
+
+def merge(data: Optional[dict], **labels) -> None:
+    """
+    Add metrics collected in another process.
+    Its gauges are saved with `labels`, so workers do not overwrite each other
+    """
+    if data is None or not _enabled:
+        return
+    label = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    with _lock:
+        for name, value in data["counters"].items():
+            _counters[name] = _counters.get(name, 0) + value
+        for name, value in data["gauges"].items():
+            _gauges[f"{name}{{{label}}}" if label else name] = value
+        for name, stats in data["timers"].items():
+            current = _timers.get(name)
+            if current is None:
+                _timers[name] = [stats["count"], stats["total"], stats["max"]]
+            else:
+                current[0] += stats["count"]
+                current[1] += stats["total"]
+                current[2] = max(current[2], stats["max"])
+
+
+def to_prometheus(data: Optional[dict] = None) -> str:
+    if data is None:
+        data = snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name} {value}")
+    previous_name = None
+    for name, value in sorted(data["gauges"].items()):
+        # labeled values of one gauge share the TYPE line
+        base_name = name.split("{")[0]
+        if base_name != previous_name:
+            lines.append(f"# TYPE {PREFIX}{base_name} gauge")
+            previous_name = base_name
+        lines.append(f"{PREFIX}{name} {value}")
+    for name, stats in sorted(data["timers"].items()):
+        lines.append(f"# TYPE {PREFIX}{name} summary")
+        lines.append(f"{PREFIX}{name}_count {stats['count']}")
+        lines.append(f"{PREFIX}{name}_sum {stats['total']}")
+        lines.append(f"# TYPE {PREFIX}{name}_max gauge")
+        lines.append(f"{PREFIX}{name}_max {stats['max']}")
+    return "\n".join(lines) + "\n"
+
+
+def export(path: str) -> None:
+    data = snapshot()
+    tmp_path = path + ".tmp"
+    with _export_lock:
+        with open(tmp_path, "w+") as f:
+            if path.endswith(".prom"):
+                f.write(to_prometheus(data))
+            else:
+                json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def start_exporter(path: str, interval: float = 10) -> threading.Thread:
+    """Write snapshots to `path` every `interval` seconds and at exit"""
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            export(path)
+
+    def stop():
+        stopped.set()
+        thread.join()
+        export(path)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    atexit.register(stop)
+    return thread
+
+
+def start_profiling(path: str) -> cProfile.Profile:
+    """Profile the whole process with cProfile, stats are dumped to `path` at exit"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(path)
+
+    atexit.register(stop)
+    return profiler
+
+
+class Sampler:
+    """
+    Sampling profiler: every `interval` seconds records the function
+    running in the observed thread. Much cheaper than cProfile for long runs
+    """
+
+    def __init__(self, interval: float = 0.01, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                code = frame.f_code
+                self.samples[f"{code.co_filename}:{code.co_name}"] += 1
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def top(self, count: int = 20) -> list:
+        return self.samples.most_common(count)
+
+
+if os.environ.get("OIP_METRICS") == "1":
+    enable()
+    if os.environ.get("OIP_METRICS_EXPORT"):
+        start_exporter(
+            os.environ["OIP_METRICS_EXPORT"],
+            float(os.environ.get("OIP_METRICS_INTERVAL", 10)),
+        )
+if os.environ.get("OIP_PROFILE"):
+    start_profiling(os.environ["OIP_PROFILE"])
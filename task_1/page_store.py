@@ -0,0 +1,175 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import os
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+# document id, codec, compressed length
+RECORD_HEADER = struct.Struct(">IBI")
+OFFSETS_FILENAME = "offsets.txt"
+MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+
+
+def segment_path(directory: str, segment_id: int) -> str:
+    return os.path.join(directory, f"segment_{segment_id}.seg")
+
+
+def is_page_store(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, OFFSETS_FILENAME))
+
+
+def compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Page is compressed with zstd, install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def read_offsets(directory: str) -> Dict[int, Tuple[int, int]]:
+    """
+    Read doc id -> (segment id, offset) index.
+    Store is append-only, so the last record of a page wins
+    """
+    offsets = {}
+    path = os.path.join(directory, OFFSETS_FILENAME)
+    if not os.path.exists(path):
+        return offsets
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+            page_id, segment_id, offset = map(int, parts)
+            offsets[page_id] = (segment_id, offset)
+    return offsets
+
+
+class PageStoreWriter:
+    """
+    Appends compressed pages to segment files
+    and their positions to the offsets file
+    """
+
+    def __init__(self, directory: str, codec: Optional[int] = None):
+        if codec is None:
+            codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        if codec == CODEC_ZSTD and zstandard is None:
+            raise RuntimeError("zstd codec requires zstandard package")
+        self.directory = directory
+        self.codec = codec
+        os.makedirs(directory, exist_ok=True)
+
+        self.segment_id = 0
+        offsets = read_offsets(directory)
+        if offsets:
+            self.segment_id = max(segment_id for segment_id, _ in offsets.values())
+        self.segment = open(segment_path(directory, self.segment_id), "ab")
+        self.offsets = open(os.path.join(directory, OFFSETS_FILENAME), "a")
+
+    def append(self, page_id: int, content: str) -> None:
+        if self.segment.tell() >= MAX_SEGMENT_SIZE:
+            self.segment.close()
+            self.segment_id += 1
+            self.segment = open(segment_path(self.directory, self.segment_id), "ab")
+
+        data = compress(content.encode("utf-8"), self.codec)
+        offset = self.segment.tell()
+        self.segment.write(RECORD_HEADER.pack(page_id, self.codec, len(data)))
+        self.segment.write(data)
+        # offset is written only after the record, so a crash never indexes half a page
+        self.segment.flush()
+        self.offsets.write(f"{page_id} {self.segment_id} {offset}\n")
+        self.offsets.flush()
+
+    def close(self) -> None:
+        self.segment.close()
+        self.offsets.close()
+
+    def __enter__(self) -> "PageStoreWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class PageStoreReader:
+    """Random access by page id and sequential iteration over segments"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.offsets = read_offsets(directory)
+
+    def page_ids(self) -> List[int]:
+        return sorted(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, page_id: int) -> bool:
+        return page_id in self.offsets
+
+    def get(self, page_id: int) -> str:
+        segment_id, offset = self.offsets[page_id]
+        with open(segment_path(self.directory, segment_id), "rb") as f:
+            f.seek(offset)
+            _, content = self._read_record(f)
+        return content
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        return self.iterate()
+
+    def iterate(
+        self, on_error: Optional[Callable[[int, Exception], None]] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (page id, content) in the order of segments on disk.
+        If on_error is given, a page that can not be read is passed to it
+        and skipped, otherwise the error is raised
+        """
+        positions = sorted(
+            (segment_id, offset, page_id)
+            for page_id, (segment_id, offset) in self.offsets.items()
+        )
+        current_segment_id = None
+        f = None
+        try:
+            for segment_id, offset, page_id in positions:
+                if segment_id != current_segment_id:
+                    if f is not None:
+                        f.close()
+                    f = open(segment_path(self.directory, segment_id), "rb")
+                    current_segment_id = segment_id
+                # records are sorted, so seek is a no-op unless a page was overwritten
+                if f.tell() != offset:
+                    f.seek(offset)
+                try:
+                    _, content = self._read_record(f)
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(page_id, e)
+                    continue
+                yield page_id, content
+        finally:
+            if f is not None:
+                f.close()
+
+    @staticmethod
+    def _read_record(f) -> Tuple[int, str]:
+        page_id, codec, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+        data = decompress(f.read(length), codec)
+        return page_id, data.decode("utf-8")
@@ -0,0 +1,115 @@
+import logging
+import sys
+import time
+from typing import List, Optional
+
+import requests
+
+from crawler import SLEEP_TIME, parse_webpage_content, save_webpage
+import metrics
+from page_store import PageStoreWriter
+from validators import DEFAULT_VALIDATORS_PATH, ValidatorCache
+
+
+logger = logging.getLogger("__main__")
+
+
+def load_index(path: str) -> List[str]:
+    index = []
+    with open(path, "r") as f:
+        for line in f:
+            page_id, url = line.rstrip("\n").split(" ", 1)
+            assert int(page_id) == len(index), f"Broken index line: {line}"
+            index.append(url)
+    return index
+
+
+def save_changed_pages(page_ids: List[int], path: str) -> None:
+    with open(path, "w+") as f:
+        for page_id in page_ids:
+            f.write(f"{page_id}\n")
+
+
+def get_recrawl_order(index: List[str], validator_cache: ValidatorCache) -> List[int]:
+    """Pages that changed more often are re-fetched first"""
+    return sorted(
+        range(len(index)),
+        key=lambda page_id: -validator_cache.change_frequency(index[page_id]),
+    )
+
+
+def recrawl(
+    index: List[str],
+    validator_cache: ValidatorCache,
+    page_store: PageStoreWriter,
+    changed_pages_path: Optional[str] = None,
+    sleep_time: float = SLEEP_TIME,
+) -> List[int]:
+    """
+    Re-fetch pages with conditional requests.
+    Returns ids of pages whose content changed and was re-saved.
+    Validators and changed page ids are saved even if the run is interrupted,
+    because changed pages are already in the page store
+    """
+    changed_pages = []
+    try:
+        for page_id in get_recrawl_order(index, validator_cache):
+            url = index[page_id]
+            headers = validator_cache.get_conditional_headers(url)
+            logger.info("Re-requesting %s", url)
+            try:
+                with metrics.timer("crawler_fetch_seconds"):
+                    response = requests.get(url, headers=headers)
+            except requests.RequestException as e:
+                metrics.increment("crawler_fetch_errors")
+                logger.warning("Could not make request to %s: %s", url, e)
+                time.sleep(sleep_time)
+                continue
+            metrics.increment("crawler_fetched_bytes", len(response.content))
+
+            if response.status_code == 304:
+                validator_cache.mark_not_modified(url)
+                metrics.increment("crawler_not_modified")
+                logger.info("%d) Not modified %s", page_id, url)
+            elif not response.ok:
+                metrics.increment("crawler_fetch_errors")
+                logger.warning("Could not make request to %s", url)
+            else:
+                text, _, _ = parse_webpage_content(response.text, original_url=url)
+                if validator_cache.update(url, page_id, response, text):
+                    save_webpage(text, page_id=page_id, page_store=page_store)
+                    changed_pages.append(page_id)
+                    logger.info("%d) Changed %s", page_id, url)
+                else:
+                    logger.info("%d) Same content %s", page_id, url)
+
+            time.sleep(sleep_time)
+    finally:
+        validator_cache.save()
+        if changed_pages_path is not None:
+            save_changed_pages(sorted(changed_pages), changed_pages_path)
+
+    return sorted(changed_pages)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1:
+        logger.error("Error! Re-crawl takes no arguments, it uses results/index.txt")
+        exit(1)
+
+    index = load_index("results/index.txt")
+    validator_cache = ValidatorCache(DEFAULT_VALIDATORS_PATH)
+    with PageStoreWriter("results/pages") as page_store:
+        changed_pages = recrawl(
+            index, validator_cache, page_store, changed_pages_path="results/changed.txt"
+        )
+    logger.info(
+        "Re-crawled %d pages, %d changed. Saved ids to results/changed.txt",
+        len(index),
+        len(changed_pages),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from dedup import NearDuplicateDetector, simhash
+import metrics
+import page_store
+from page_store import PageStoreReader, PageStoreWriter
+from recrawl import recrawl
+from validators import ValidatorCache
+
+
+class StubPage:
+    def __init__(self, text: str, etag: str):
+        self.text = text
+        self.etag = etag
+        self.full_responses = 0
+        self.not_modified_responses = 0
+
+    def html(self) -> str:
+        return f'<html><body><div id="bodyContent"><p>{self.text}</p></div></body></html>'
+
+
+def create_stub_server(page: StubPage) -> HTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == page.etag:
+                page.not_modified_responses += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            page.full_responses += 1
+            body = page.html().encode("utf-8")
+            self.send_response(200)
+            self.send_header("ETag", page.etag)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_case_recrawl():
+    print("*****")
+    print("Testing conditional re-crawl against a stub server")
+    page = StubPage("Матроид", etag='"v1"')
+    server = create_stub_server(page)
+    url = f"http://127.0.0.1:{server.server_address[1]}/wiki/Матроид"
+
+    with tempfile.TemporaryDirectory() as directory:
+        pages_directory = os.path.join(directory, "pages")
+        validator_cache = ValidatorCache(os.path.join(directory, "validators.json"))
+
+        changed_pages_path = os.path.join(directory, "changed.txt")
+
+        # first fetch: no validators yet, page is downloaded.
+        # Unreachable url is skipped and does not stop the re-crawl
+        unreachable_url = "http://127.0.0.1:1/wiki/Недоступная"
+        index = [unreachable_url, url]
+        with PageStoreWriter(pages_directory) as page_store:
+            changed = recrawl(
+                index,
+                validator_cache,
+                page_store,
+                changed_pages_path=changed_pages_path,
+                sleep_time=0,
+            )
+        assert changed == [1], f"New page should be saved, got {changed}"
+        assert page.full_responses == 1
+        with open(changed_pages_path, "r") as f:
+            assert f.read() == "1\n", "Changed pages were not saved"
+        assert os.path.exists(validator_cache.path), "Validators were not saved"
+
+        # nothing changed: server answers 304, page is not saved again
+        with PageStoreWriter(pages_directory) as page_store:
+            changed = recrawl(index, validator_cache, page_store, sleep_time=0)
+        assert changed == [], f"Not modified page was re-saved: {changed}"
+        assert page.not_modified_responses == 1
+
+        # page changed: new content replaces the stored one
+        page.text = "Граф"
+        page.etag = '"v2"'
+        with PageStoreWriter(pages_directory) as page_store:
+            changed = recrawl(index, validator_cache, page_store, sleep_time=0)
+        assert changed == [1], f"Changed page should be re-saved, got {changed}"
+        assert "Граф" in PageStoreReader(pages_directory).get(1)
+
+        # reloaded cache keeps validators and change statistics
+        validator_cache.save()
+        reloaded_cache = ValidatorCache(validator_cache.path)
+        assert reloaded_cache.get_conditional_headers(url) == {"If-None-Match": '"v2"'}
+        assert reloaded_cache.change_frequency(url) == 2 / 4
+
+    server.shutdown()
+    print("Test case recrawl is successful")
+    print("*****")
+
+
+def test_case_page_store():
+    print("*****")
+    print("Testing segmented page store")
+    pages = {page_id: f"<p>Страница {page_id}</p>" * 20 for page_id in range(30)}
+    max_segment_size = page_store.MAX_SEGMENT_SIZE
+    # small segments, so pages are spread over several files
+    page_store.MAX_SEGMENT_SIZE = 200
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            with PageStoreWriter(directory) as writer:
+                for page_id, content in pages.items():
+                    writer.append(page_id, content)
+            segments = [f for f in os.listdir(directory) if f.endswith(".seg")]
+            assert len(segments) > 1, f"Expected several segments, got {segments}"
+
+            reader = PageStoreReader(directory)
+            assert reader.page_ids() == list(pages)
+            assert dict(reader) == pages, "Iteration returned different pages"
+            for page_id, content in pages.items():
+                assert reader.get(page_id) == content, f"Wrong page {page_id}"
+
+            # reopened store continues the last segment, last write wins
+            with PageStoreWriter(directory) as writer:
+                writer.append(5, "новая версия")
+                writer.append(30, "новая страница")
+            pages[5] = "новая версия"
+            pages[30] = "новая страница"
+            reader = PageStoreReader(directory)
+            assert dict(reader) == pages, "Reopened store returned different pages"
+            assert reader.get(5) == "новая версия"
+            assert len(reader) == 31
+
+            # corrupt record is reported and skipped, other pages are still read
+            segment_id, offset = reader.offsets[7]
+            with open(page_store.segment_path(directory, segment_id), "r+b") as f:
+                f.seek(offset + page_store.RECORD_HEADER.size)
+                f.write(b"\x00" * 8)
+            errors = []
+            read_pages = dict(reader.iterate(lambda page_id, e: errors.append(page_id)))
+            assert errors == [7], f"Expected error for page 7, got {errors}"
+            del pages[7]
+            assert read_pages == pages, "Pages after corrupt record were not read"
+    finally:
+        page_store.MAX_SEGMENT_SIZE = max_segment_size
+
+    print("Test case page store is successful")
+    print("*****")
+
+
+def test_case_near_duplicates():
+    print("*****")
+    print("Testing near-duplicate detection")
+    words = [f"слово{i}" for i in range(300)]
+    text = " ".join(words)
+    near_duplicate = " ".join(words[:150] + ["другое"] + words[151:])
+    other_text = " ".join(reversed(words))
+
+    detector = NearDuplicateDetector()
+    assert detector.check(0, text) is None, "First page can not be a duplicate"
+    assert detector.check(1, near_duplicate) == 0, "Near-duplicate was not found"
+    assert detector.check(2, other_text) is None, "Different page is a duplicate"
+    assert detector.duplicate_ratio == 1 / 3, f"Ratio: {detector.duplicate_ratio}"
+
+    # empty and very short pages have no fingerprint and are never duplicates
+    assert simhash("") is None and simhash("Кошка") is None
+    assert detector.check(3, "") is None
+    assert detector.check(4, "") is None
+    assert detector.check(5, "Кошка") is None
+    assert detector.check(6, "Кошка") is None
+    assert detector.duplicates == 1
+
+    print("Test case near duplicates is successful")
+    print("*****")
+
+
+def test_case_metrics():
+    print("*****")
+    print("Testing metrics")
+    was_enabled = metrics.is_enabled()
+    try:
+        # disabled: shared no-op timer, nothing is recorded
+        metrics.disable()
+        metrics.reset()
+        assert metrics.timer("a") is metrics.timer("b"), "Disabled timer is not shared"
+        with metrics.timer("search_eval_seconds"):
+            pass
+        metrics.increment("search_queries")
+        metrics.set_gauge("index_terms", 10)
+        assert metrics.collect() is None
+        data = metrics.snapshot()
+        assert data["counters"] == {} and data["gauges"] == {} and data["timers"] == {}
+
+        # enabled: counters add up, gauges keep the last value
+        metrics.enable()
+        metrics.increment("search_queries")
+        metrics.increment("search_queries", 2)
+        metrics.set_gauge("index_terms", 10)
+        metrics.set_gauge("index_terms", 7)
+        with metrics.timer("search_eval_seconds"):
+            pass
+        metrics.observe("search_eval_seconds", 0.5)
+        data = metrics.snapshot()
+        assert data["counters"] == {"search_queries": 3}
+        assert data["gauges"] == {"index_terms": 7}
+        stats = data["timers"]["search_eval_seconds"]
+        assert stats["count"] == 2 and stats["max"] == 0.5, f"Timer stats: {stats}"
+
+        lines = metrics.to_prometheus(data).splitlines()
+        for line in [
+            "# TYPE oip_search_queries counter",
+            "oip_search_queries 3",
+            "# TYPE oip_index_terms gauge",
+            "oip_index_terms 7",
+            "# TYPE oip_search_eval_seconds summary",
+            "oip_search_eval_seconds_count 2",
+            "oip_search_eval_seconds_max 0.5",
+        ]:
+            assert line in lines, f"No `{line}` in Prometheus output"
+
+        # worker metrics: collect clears them, merge adds them in the parent
+        worker_metrics = metrics.collect()
+        assert metrics.snapshot()["counters"] == {}, "Collect did not clear metrics"
+        metrics.increment("search_queries")
+        metrics.observe("search_eval_seconds", 1.0)
+        metrics.merge(worker_metrics)
+        data = metrics.snapshot()
+        assert data["counters"] == {"search_queries": 4}
+        stats = data["timers"]["search_eval_seconds"]
+        assert stats["count"] == 3 and stats["max"] == 1.0, f"Merged stats: {stats}"
+
+        # gauges of labeled workers are kept apart
+        metrics.reset()
+        for shard, terms in enumerate([5, 8]):
+            shard_metrics = {"counters": {}, "gauges": {"index_terms": terms}, "timers": {}}
+            metrics.merge(shard_metrics, shard=shard)
+        data = metrics.snapshot()
+        assert data["gauges"] == {
+            'index_terms{shard="0"}': 5,
+            'index_terms{shard="1"}': 8,
+        }, f"Gauges: {data['gauges']}"
+        lines = metrics.to_prometheus(data).splitlines()
+        assert lines == [
+            "# TYPE oip_index_terms gauge",
+            'oip_index_terms{shard="0"} 5',
+            'oip_index_terms{shard="1"} 8',
+        ], f"Prometheus output: {lines}"
+
+        # final export at exit does not race with the exporter thread
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.prom")
+            for _ in range(20):
+                threads = [
+                    threading.Thread(target=metrics.export, args=(path,))
+                    for _ in range(4)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            with open(path, "r") as f:
+                assert f.read() == metrics.to_prometheus(data)
+    finally:
+        metrics.reset()
+        if not was_enabled:
+            metrics.disable()
+
+    print("Test case metrics is successful")
+    print("*****")
+
+
+if __name__ == "__main__":
+    test_case_metrics()
+    test_case_near_duplicates()
+    test_case_page_store()
+    test_case_recrawl()
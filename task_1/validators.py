@@ -0,0 +1,77 @@
+from typing import Dict
+import hashlib
+import json
+import os
+
+import requests
+
+
+DEFAULT_VALIDATORS_PATH = "results/validators.json"
+
+
+def get_content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ValidatorCache:
+    """
+    Per-URL HTTP validators (ETag / Last-Modified) and change statistics:
+    how many times a page was re-checked and how many times it changed
+    """
+
+    def __init__(self, path: str = DEFAULT_VALIDATORS_PATH):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def get_conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self.entries.get(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def change_frequency(self, url: str) -> float:
+        """Share of re-checks where the page changed, smoothed for new pages"""
+        entry = self.entries.get(url)
+        if entry is None:
+            return 1.0
+        return (entry["changes"] + 1) / (entry["checks"] + 2)
+
+    def update(
+        self, url: str, page_id: int, response: requests.Response, content: str
+    ) -> bool:
+        """
+        Save validators of a full response.
+        Returns True if content differs from the previously stored one
+        """
+        content_hash = get_content_hash(content)
+        entry = self.entries.get(url)
+        changed = entry is None or entry["content_hash"] != content_hash
+        if entry is None:
+            entry = {"checks": 0, "changes": 0}
+            self.entries[url] = entry
+        else:
+            entry["checks"] += 1
+            entry["changes"] += int(changed)
+        entry["page_id"] = page_id
+        entry["etag"] = response.headers.get("ETag")
+        entry["last_modified"] = response.headers.get("Last-Modified")
+        entry["content_hash"] = content_hash
+        return changed
+
+    def mark_not_modified(self, url: str) -> None:
+        self.entries[url]["checks"] += 1
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w+") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
@@ -1,98 +1,244 @@
 import os
 import re
 import sys
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
-import nltk
-from nltk.corpus import stopwords
 from bs4 import BeautifulSoup
-import pymorphy2
 
+TASK_1_DIRECTORY = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "task_1")
+)
+if TASK_1_DIRECTORY not in sys.path:
+    sys.path.append(TASK_1_DIRECTORY)
+from page_store import PageStoreReader, is_page_store
+import metrics
+
+# nltk resource path -> package name for nltk.download
+NLTK_RESOURCES = {
+    "corpora/stopwords": "stopwords",
+    "tokenizers/punkt": "punkt",
+    "tokenizers/punkt_tab": "punkt_tab",
+}
+
+# nltk and pymorphy2 are slow to import and load, so they are loaded on first use
+_stop_words = None
+_morph = None
+# token -> lemma, the same words repeat across pages
+_lemma_cache: Dict[str, str] = {}
+
+
+def check_nltk_resources() -> List[str]:
+    """Return names of missing nltk resources, never goes to the network"""
+    import nltk
+
+    missing = []
+    for resource_path, package in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            missing.append(package)
+    return missing
 
-try:
-    stopwords.words("russian")
-except LookupError:
-    nltk.download("stopwords")
 
-try:
-    nltk.word_tokenize("test")
-except LookupError:
-    nltk.download("punkt")
-    nltk.download("punkt_tab")
+def ensure_nltk_resources() -> None:
+    import nltk
 
+    for package in check_nltk_resources():
+        nltk.download(package)
 
-def is_russian(word: str) -> bool:
-    return bool(re.match(r"^[а-яё]+$", word, re.IGNORECASE))
 
+def get_stop_words() -> Set[str]:
+    global _stop_words
+    if _stop_words is None:
+        from nltk.corpus import stopwords
 
-def process_pages(directory: str) -> None:
+        _stop_words = set(stopwords.words("russian"))
+    return _stop_words
 
-    stop_words = set(stopwords.words("russian"))
-    morph = pymorphy2.MorphAnalyzer()
 
-    for filename in os.listdir(directory):
-        file_number = filename[:-5]
-        output_tokens_file = f"results/tokens_{file_number}.txt"
-        output_lemma_file = f"results/lemmas_{file_number}.txt"
+def get_morph():
+    global _morph
+    if _morph is None:
+        import pymorphy2
+
+        _morph = pymorphy2.MorphAnalyzer()
+    return _morph
+
+
+def prewarm() -> None:
+    """
+    Load stop words, tokenizer and pymorphy2 dictionaries now.
+    Called before forking workers, so they share the loaded data
+    """
+    import nltk
+
+    get_stop_words()
+    get_morph()
+    nltk.word_tokenize("прогрев")
+
+
+def is_russian(word: str) -> bool:
+    return bool(re.match(r"^[а-яё]+$", word, re.IGNORECASE))
+
 
-        tokens = set()
-        lemma_to_tokens = {}
+def read_pages(
+    directory: str, page_ids: Optional[Set[int]] = None
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (page number, html) from the segmented page store,
+    or from separate `{номер}.html` files for crawls made before it.
+    If page_ids are given, only these pages are read
+    """
+    if is_page_store(directory):
+        # битая запись пропускается, как и нечитаемый файл ниже
+        def on_error(page_id: int, e: Exception) -> None:
+            print(f"Ошибка при чтении страницы {page_id}: {e}")
+
+        page_store = PageStoreReader(directory)
+        if page_ids is None:
+            for page_id, html_content in page_store.iterate(on_error):
+                yield str(page_id), html_content
+            return
+        for page_id in sorted(page_ids):
+            if page_id not in page_store:
+                print(f"Страница {page_id} не найдена в хранилище")
+                continue
+            try:
+                html_content = page_store.get(page_id)
+            except Exception as e:
+                on_error(page_id, e)
+                continue
+            yield str(page_id), html_content
+        return
 
+    for filename in os.listdir(directory):
+        if not filename.endswith(".html"):
+            continue
+        if page_ids is not None and filename[:-5] not in map(str, page_ids):
+            continue
         filepath = os.path.join(directory, filename)
         try:
             with open(filepath, "r", encoding="utf-8") as f:
                 html_content = f.read()
-            soup = BeautifulSoup(html_content, "html.parser")
-            text = soup.get_text(separator=" ", strip=True)
-            words = nltk.word_tokenize(
-                text.lower()
-            )  # токенизация и приведение к нижнему регистру
-
-            for word in words:
-                # фильтрация (только из русских букв, не стоп-слова, без цифр, длиной больше 1)
-                if (
-                    is_russian(word)
-                    and word not in stop_words
-                    and not re.search(r"\d", word)
-                    and len(word) > 1
-                ):
-                    tokens.add(word)
-
-            # лемматизация
+        except Exception as e:
+            print(f"Ошибка при чтении файла {filename}: {e}")
+            continue
+        yield filename[:-5], html_content
+
+
+def read_page_ids(path: str) -> Set[int]:
+    with open(path, "r") as f:
+        return {int(line) for line in f if line.strip()}
+
+
+def lemmatize(token: str, morph) -> str:
+    lemma = _lemma_cache.get(token)
+    if lemma is not None:
+        metrics.increment("tokenizer_lemma_cache_hits")
+        return lemma
+    metrics.increment("tokenizer_lemma_cache_misses")
+    lemma = morph.parse(token)[0].normal_form
+    _lemma_cache[token] = lemma
+    return lemma
+
+
+def tokenize_page(
+    html_content: str, stop_words: Set[str], morph
+) -> Tuple[Set[str], Dict[str, Set[str]]]:
+    """Get tokens and lemma -> tokens mapping for a single page"""
+    with metrics.timer("tokenizer_html_seconds"):
+        soup = BeautifulSoup(html_content, "html.parser")
+        text = soup.get_text(separator=" ", strip=True)
+    return tokenize_text(text, stop_words, morph)
+
+
+def tokenize_text(
+    text: str, stop_words: Set[str], morph
+) -> Tuple[Set[str], Dict[str, Set[str]]]:
+    """Same as `tokenize_page` for text already extracted from html"""
+    import nltk
+
+    tokens = set()
+    lemma_to_tokens = {}
+
+    with metrics.timer("tokenizer_nltk_seconds"):
+        words = nltk.word_tokenize(
+            text.lower()
+        )  # токенизация и приведение к нижнему регистру
+    metrics.increment("tokenizer_pages")
+    metrics.increment("tokenizer_words", len(words))
+
+    for word in words:
+        # фильтрация (только из русских букв, не стоп-слова, без цифр, длиной больше 1)
+        if (
+            is_russian(word)
+            and word not in stop_words
+            and not re.search(r"\d", word)
+            and len(word) > 1
+        ):
+            tokens.add(word)
+
+    # лемматизация
+    with metrics.timer("tokenizer_lemmatize_seconds"):
+        for token in tokens:
+            lemma = lemmatize(token, morph)
+            if lemma not in lemma_to_tokens:
+                lemma_to_tokens[lemma] = set()
+            lemma_to_tokens[lemma].add(token)
+    metrics.increment("tokenizer_tokens", len(tokens))
+
+    return tokens, lemma_to_tokens
+
+
+def save_page_results(
+    file_number: str, tokens: Set[str], lemma_to_tokens: Dict[str, Set[str]]
+) -> None:
+    output_tokens_file = f"results/tokens_{file_number}.txt"
+    output_lemma_file = f"results/lemmas_{file_number}.txt"
+    try:
+        with open(output_tokens_file, "w+", encoding="utf-8") as f:
             for token in tokens:
-                parsed_word = morph.parse(token)[0]
-                lemma = parsed_word.normal_form
-                if lemma not in lemma_to_tokens:
-                    lemma_to_tokens[lemma] = set()
-                lemma_to_tokens[lemma].add(token)
+                f.write(token + "\n")
 
-            # сохранение в файлы
-            try:
-                with open(output_tokens_file, "w+", encoding="utf-8") as f:
-                    for token in tokens:
-                        f.write(token + "\n")
+        with open(output_lemma_file, "w+", encoding="utf-8") as f:
+            for lemma, token_set in lemma_to_tokens.items():
+                f.write(lemma + ": " + " ".join(token_set) + "\n")
 
-                with open(output_lemma_file, "w+", encoding="utf-8") as f:
-                    for lemma, token_set in lemma_to_tokens.items():
-                        f.write(lemma + ": " + " ".join(token_set) + "\n")
+        print(f"Токены сохранены в {output_tokens_file}")
+        print(f"Лемматизированные токены сохранены в {output_lemma_file}")
 
-                print(f"Токены сохранены в {output_tokens_file}")
-                print(f"Лемматизированные токены сохранены в {output_lemma_file}")
+    except Exception as e:
+        print(f"Ошибка при сохранении файлов: {e}")
 
-            except Exception as e:
-                print(f"Ошибка при сохранении файлов: {e}")
 
+def process_pages(directory: str, page_ids: Optional[Set[int]] = None) -> None:
+
+    stop_words = get_stop_words()
+    morph = get_morph()
+
+    for file_number, html_content in read_pages(directory, page_ids):
+        try:
+            tokens, lemma_to_tokens = tokenize_page(html_content, stop_words, morph)
         except Exception as e:
-            print(f"Ошибка при обработке файла {filename}: {e}")
+            print(f"Ошибка при обработке страницы {file_number}: {e}")
+            continue
+        # сохранение в файлы
+        save_page_results(file_number, tokens, lemma_to_tokens)
 
 
 if __name__ == "__main__":
     directory_path = "../task_1/results/pages"
-    if len(sys.argv) == 2:
+    page_ids = None
+    if len(sys.argv) >= 2 and sys.argv[1] != "-":
         directory_path = sys.argv[1]
-    elif len(sys.argv) > 2:
+    if len(sys.argv) == 3:
+        page_ids = read_page_ids(sys.argv[2])
+        print(f"Обрабатываем только {len(page_ids)} измененных страниц")
+    elif len(sys.argv) > 3:
         print("Ошибка, слишком много аргументов")
         exit(1)
     print(f"Ищем скачанные страницы в директории {directory_path}")
     os.makedirs("results", exist_ok=True)
+    ensure_nltk_resources()
 
-    process_pages(directory_path)
+    process_pages(directory_path, page_ids)
@@ -2,6 +2,10 @@ import os
 import pathlib
 import sys
 import json
+from typing import Iterable
+
+import utils  # adds task_1 with metrics to sys.path
+import metrics
 
 
 class InvertedIndex:
@@ -16,6 +20,13 @@ class InvertedIndex:
             if not isinstance(v, set):
                 self.mapping[k] = set(v)
 
+    def add_document(self, document_id: int, lemmas: Iterable[str]) -> None:
+        self.all_documents.add(document_id)
+        for lemma in lemmas:
+            if lemma not in self.mapping:
+                self.mapping[lemma] = set()
+            self.mapping[lemma].add(document_id)
+
 
 class SetEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -33,15 +44,70 @@ def save_inverted_index(inverted_index: InvertedIndex, path: str) -> None:
         json.dump(inverted_index, f, cls=SetEncoder, ensure_ascii=False)
 
 
-def load_inverted_index(path: str) -> None:
-    with open(path, "r") as f:
-        args = json.load(f)
-        return InvertedIndex(**args)
+def load_inverted_index(path: str) -> InvertedIndex:
+    with metrics.timer("index_load_seconds"):
+        with open(path, "r") as f:
+            args = json.load(f)
+            inverted_index = InvertedIndex(**args)
+    metrics.set_gauge("index_terms", len(inverted_index.mapping))
+    return inverted_index
+
+
+def shard_inverted_index(
+    inverted_index: InvertedIndex, num_shards: int
+) -> list[InvertedIndex]:
+    """
+    Partition index by document id ranges into `num_shards` shards.
+    Every shard keeps only its own documents in `all_documents`,
+    so NOT is evaluated correctly inside the shard
+    """
+    if num_shards < 1:
+        raise ValueError(f"Number of shards must be positive, got {num_shards}")
+    document_ids = sorted(inverted_index.all_documents)
+    shard_size = max(1, -(-len(document_ids) // num_shards))
+
+    shards = []
+    document_to_shard = {}
+    for shard_number in range(num_shards):
+        shard_documents = set(
+            document_ids[shard_number * shard_size : (shard_number + 1) * shard_size]
+        )
+        for document_id in shard_documents:
+            document_to_shard[document_id] = shard_number
+        shards.append(InvertedIndex(mapping={}, all_documents=shard_documents))
+
+    for lemma, lemma_documents in inverted_index.mapping.items():
+        for document_id in lemma_documents:
+            shard_mapping = shards[document_to_shard[document_id]].mapping
+            if lemma not in shard_mapping:
+                shard_mapping[lemma] = set()
+            shard_mapping[lemma].add(document_id)
+
+    return shards
+
+
+def save_sharded_inverted_index(shards: list[InvertedIndex], directory: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for shard_number, shard in enumerate(shards):
+        save_inverted_index(shard, os.path.join(directory, f"shard_{shard_number}.json"))
+
+
+def get_shard_paths(directory: str) -> list[str]:
+    shard_files = []
+    for filename in os.listdir(directory):
+        if not filename.startswith("shard_") or not filename.endswith(".json"):
+            continue
+        try:
+            shard_number = int(filename[6:-5])
+        except ValueError:
+            print(f"Incorrect filename: {filename}, skipping")
+            continue
+        shard_files.append((shard_number, os.path.join(directory, filename)))
+    return [path for _, path in sorted(shard_files)]
 
 
 def build_inverted_index(lemma_directory: str) -> InvertedIndex:
-    inverted_index = {}
-    all_documents = set()
+    inverted_index = InvertedIndex(mapping={}, all_documents=set())
     for filename in os.listdir(lemma_directory):
         if not filename.startswith("lemmas_"):
             continue
@@ -50,30 +116,31 @@ def build_inverted_index(lemma_directory: str) -> InvertedIndex:
         except ValueError:
             print(f"Incorrect filename: {filename}, skipping")
             continue
-        all_documents.add(document_id)
         with open(os.path.join(lemma_directory, filename), "r", encoding="utf-8") as f:
             lines = f.readlines()
             lemmas = [line.split(":")[0] for line in lines]
 
-        for lemma in lemmas:
-            if lemma not in inverted_index:
-                inverted_index[lemma] = set()
-            inverted_index[lemma].add(document_id)
+        inverted_index.add_document(document_id, lemmas)
 
-    return InvertedIndex(mapping=inverted_index, all_documents=all_documents)
+    return inverted_index
 
 
 if __name__ == "__main__":
     os.makedirs("results", exist_ok=True)
     inverted_index_file = "results/inverted_index.json"
     lemma_directory = "../task_2/results"
+    num_shards = 0
     if len(sys.argv) == 1:
         pass
     elif len(sys.argv) == 2:
         inverted_index_file = sys.argv[1]
     elif len(sys.argv) == 3:
         inverted_index_file = sys.argv[1]
-        lemma_directory = sys.argv[1]
+        lemma_directory = sys.argv[2]
+    elif len(sys.argv) == 4:
+        inverted_index_file = sys.argv[1]
+        lemma_directory = sys.argv[2]
+        num_shards = int(sys.argv[3])
     else:
         print("Error, too many args")
         exit(1)
@@ -81,3 +148,11 @@ if __name__ == "__main__":
     inverted_index = build_inverted_index(lemma_directory)
     save_inverted_index(inverted_index, inverted_index_file)
     print("Created index! Location:", inverted_index_file)
+
+    if num_shards > 0:
+        shards_directory = os.path.join(
+            os.path.dirname(inverted_index_file) or ".", "shards"
+        )
+        shards = shard_inverted_index(inverted_index, num_shards)
+        save_sharded_inverted_index(shards, shards_directory)
+        print(f"Created {num_shards} shards! Location:", shards_directory)
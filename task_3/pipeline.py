@@ -0,0 +1,290 @@
+from collections import deque
+from urllib.parse import unquote
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import utils  # adds task_1 and task_2 to sys.path
+from crawler import (
+    DEFAULT_MAX_PAGES,
+    DEFAULT_STARTING_URL,
+    SLEEP_TIME,
+    get_page_content,
+    parse_webpage_content,
+)
+from create_tokens import (
+    ensure_nltk_resources,
+    get_morph,
+    get_stop_words,
+    prewarm,
+    tokenize_text,
+)
+from dedup import NearDuplicateDetector, simhash
+from inverted_index import InvertedIndex, save_inverted_index
+import metrics
+from page_store import PageStoreWriter
+
+# fetchers share one rate limit of a request per SLEEP_TIME,
+# the second one only hides the latency of a slow response
+DEFAULT_FETCH_WORKERS = 2
+DEFAULT_TOKENIZE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# how many fetched pages may wait for tokenization before fetchers block
+QUEUE_SIZE = 16
+CHECKPOINT_EVERY = 10
+# how often the coordinator checks that tokenizers are alive while waiting
+WORKER_CHECK_INTERVAL = 1.0
+# forked tokenizers share prewarmed dictionaries, spawn is used where fork is absent
+START_METHOD = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class RateLimiter:
+    """Allows one request per `interval` seconds across all fetch threads"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_request_time = time.monotonic()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            request_time = max(now, self.next_request_time)
+            self.next_request_time = request_time + self.interval
+        time.sleep(request_time - now)
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+def fetch_worker(
+    url_queue: queue.Queue,
+    pages_queue: multiprocessing.Queue,
+    results_queue: multiprocessing.Queue,
+    rate_limiter: RateLimiter,
+) -> None:
+    """Stage 1 (thread): download pages"""
+    while True:
+        url = url_queue.get()
+        if url is None:
+            break
+        rate_limiter.wait()
+        try:
+            content = get_page_content(url)
+        except Exception as e:
+            print(f"Could not fetch {url}: {e}")
+            content = None
+        if content is None:
+            # every url must produce one result, so the coordinator knows it is done.
+            # Fetchers are threads and record metrics in the coordinator directly
+            results_queue.put((url, None, None))
+        else:
+            # blocks when tokenizers are behind (backpressure)
+            pages_queue.put((url, content))
+
+
+def tokenize_worker(
+    pages_queue: multiprocessing.Queue,
+    results_queue: multiprocessing.Queue,
+    starting_url: str,
+) -> None:
+    """
+    Stage 2 (process): clean html, find links, tokenize, lemmatize
+    and compute the fingerprint for near-duplicate detection.
+    Metrics recorded since the previous page are sent with every result
+    """
+    stop_words = get_stop_words()
+    morph = get_morph()
+    while True:
+        item = pages_queue.get()
+        if item is None:
+            break
+        url, content = item
+        try:
+            text, page_text, links = parse_webpage_content(
+                content, original_url=starting_url
+            )
+            # text of the crawler parse, so the page is not parsed a second time
+            _, lemma_to_tokens = tokenize_text(page_text, stop_words, morph)
+            fingerprint = simhash(page_text)
+            result = (text, fingerprint, links, list(lemma_to_tokens))
+        except Exception as e:
+            print(f"Could not process {url}: {e}")
+            result = None
+        results_queue.put((url, result, metrics.collect()))
+
+
+def save_checkpoint(inverted_index: InvertedIndex, path: str) -> None:
+    # write and rename, so search never reads a half-written index
+    tmp_path = path + ".tmp"
+    save_inverted_index(inverted_index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def get_result(
+    results_queue: multiprocessing.Queue, tokenizers: list[multiprocessing.Process]
+) -> tuple:
+    """Wait for the next result, failing if a tokenizer died and lost its page"""
+    while True:
+        try:
+            return results_queue.get(timeout=WORKER_CHECK_INTERVAL)
+        except queue.Empty:
+            for tokenizer in tokenizers:
+                if tokenizer.exitcode is not None:
+                    raise WorkerError(
+                        f"Tokenizer process {tokenizer.pid} exited "
+                        f"with code {tokenizer.exitcode}"
+                    )
+
+
+def run_pipeline(
+    starting_url: str = DEFAULT_STARTING_URL,
+    max_pages: int = DEFAULT_MAX_PAGES,
+    results_directory: str = "results",
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    tokenize_workers: int = DEFAULT_TOKENIZE_WORKERS,
+    sleep_time: float = SLEEP_TIME,
+    checkpoint_every: int = CHECKPOINT_EVERY,
+) -> InvertedIndex:
+    """
+    Crawl -> tokenize -> index without intermediate lemma files.
+    Stage 3 (indexing, page ids, crawl frontier) runs in this process,
+    the index is saved every `checkpoint_every` documents
+    """
+    os.makedirs(results_directory, exist_ok=True)
+    index_path = os.path.join(results_directory, "inverted_index.json")
+
+    context = multiprocessing.get_context(START_METHOD)
+    url_queue = queue.Queue()
+    pages_queue = context.Queue(maxsize=QUEUE_SIZE)
+    results_queue = context.Queue(maxsize=QUEUE_SIZE)
+    rate_limiter = RateLimiter(sleep_time)
+
+    fetchers = [
+        threading.Thread(
+            target=fetch_worker,
+            args=(url_queue, pages_queue, results_queue, rate_limiter),
+            daemon=True,
+        )
+        for _ in range(fetch_workers)
+    ]
+    tokenizers = [
+        context.Process(
+            target=tokenize_worker,
+            args=(pages_queue, results_queue, starting_url),
+            daemon=True,
+        )
+        for _ in range(tokenize_workers)
+    ]
+    # load dictionaries once, forked tokenizers share them.
+    # Processes are forked before any thread is started
+    prewarm()
+    for worker in tokenizers + fetchers:
+        worker.start()
+
+    inverted_index = InvertedIndex(mapping={}, all_documents=set())
+    page_store = PageStoreWriter(os.path.join(results_directory, "pages"))
+    duplicate_detector = NearDuplicateDetector()
+    frontier = deque([starting_url])
+    visited_urls = set()
+    index = []
+    in_flight = 0
+    # urls in flight are bounded, so fetchers never run far ahead of max_pages
+    max_in_flight = fetch_workers + tokenize_workers + 2 * QUEUE_SIZE
+
+    failed = True
+    try:
+        while len(index) < max_pages:
+            while (
+                frontier
+                and in_flight < max_in_flight
+                and len(index) + in_flight < max_pages
+            ):
+                url = unquote(frontier.popleft())
+                if url in visited_urls:
+                    continue
+                visited_urls.add(url)
+                url_queue.put(url)
+                in_flight += 1
+            if in_flight == 0:
+                break
+
+            url, result, worker_metrics = get_result(results_queue, tokenizers)
+            in_flight -= 1
+            metrics.merge(worker_metrics)
+            if result is None:
+                continue
+            text, fingerprint, links, lemmas = result
+            frontier.extend(links)
+
+            page_id = len(index)
+            canonical_id = duplicate_detector.check_fingerprint(page_id, fingerprint)
+            if canonical_id is not None:
+                print(f"Skipping {url}: near-duplicate of page {canonical_id}")
+                continue
+
+            page_store.append(page_id, text)
+            inverted_index.add_document(page_id, lemmas)
+            index.append(url)
+            print(f"{page_id}) Indexed {url}")
+            if len(index) % checkpoint_every == 0:
+                save_checkpoint(inverted_index, index_path)
+
+        # drain pages that are still in work, so no worker blocks on a full queue
+        while in_flight > 0:
+            _, _, worker_metrics = get_result(results_queue, tokenizers)
+            in_flight -= 1
+            metrics.merge(worker_metrics)
+        failed = False
+    finally:
+        for _ in fetchers:
+            url_queue.put(None)
+        if failed:
+            # pages in work may be lost, so queues can not be drained:
+            # stop tokenizers and do not wait for blocked fetch threads
+            for tokenizer in tokenizers:
+                tokenizer.terminate()
+            for tokenizer in tokenizers:
+                tokenizer.join()
+            pages_queue.cancel_join_thread()
+            results_queue.cancel_join_thread()
+        else:
+            for fetcher in fetchers:
+                fetcher.join()
+            for _ in tokenizers:
+                pages_queue.put(None)
+            for tokenizer in tokenizers:
+                tokenizer.join()
+        page_store.close()
+
+    save_checkpoint(inverted_index, index_path)
+    with open(os.path.join(results_directory, "index.txt"), "w+") as f:
+        for i, url in enumerate(index):
+            f.write(f"{i} {url}\n")
+    return inverted_index
+
+
+if __name__ == "__main__":
+    starting_url = DEFAULT_STARTING_URL
+    max_pages = DEFAULT_MAX_PAGES
+    if len(sys.argv) == 1:
+        pass
+    elif len(sys.argv) == 2:
+        starting_url = sys.argv[1]
+    elif len(sys.argv) == 3:
+        if sys.argv[1] != "-":
+            starting_url = sys.argv[1]
+        max_pages = int(sys.argv[2])
+    else:
+        print("Error, specify at most two arguments: starting URL and max pages")
+        exit(1)
+
+    ensure_nltk_resources()
+    inverted_index = run_pipeline(starting_url, max_pages)
+    print(
+        f"Indexed {len(inverted_index.all_documents)} pages! "
+        "Location: results/inverted_index.json"
+    )
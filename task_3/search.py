@@ -2,8 +2,9 @@ from typing import Any
 import os
 import sys
 
-from utils import find_element, lemmatize_term
+from utils import find_element, lemmatize_term, prewarm_in_background
 from inverted_index import InvertedIndex, load_inverted_index
+import metrics
 
 
 def find_parentheses(query: str) -> list[tuple[int, int]]:
@@ -89,18 +90,33 @@ def parse_query(query: str) -> list[str, Any]:
     return query_split
 
 
+def lemmatize_query(parsed_query: list[str, Any] | str) -> list[str, Any] | str:
+    """Copy of parsed query with terms replaced by their lemmas"""
+    if isinstance(parsed_query, str):
+        if parsed_query in ["AND", "OR", "NOT"]:
+            return parsed_query
+        return lemmatize_term(parsed_query)
+    return [lemmatize_query(element) for element in parsed_query]
+
+
 def run_query(
-    parsed_query: list[str, Any] | str, inverted_index: InvertedIndex
+    parsed_query: list[str, Any] | str,
+    inverted_index: InvertedIndex,
+    lemmatized: bool = False,
 ) -> set[int]:
     if isinstance(parsed_query, str):
-        return inverted_index.mapping[lemmatize_term(parsed_query)]
+        lemma = parsed_query if lemmatized else lemmatize_term(parsed_query)
+        # term may be absent, e.g. in a shard that has none of its documents
+        postings = inverted_index.mapping.get(lemma, set())
+        metrics.increment("search_postings_touched", len(postings))
+        return postings
 
     for i in range(len(parsed_query)):
         if isinstance(parsed_query[i], list) or (
             isinstance(parsed_query[i], str)
             and parsed_query[i] not in ["AND", "OR", "NOT"]
         ):
-            parsed_query[i] = run_query(parsed_query[i], inverted_index)
+            parsed_query[i] = run_query(parsed_query[i], inverted_index, lemmatized)
 
     while True:
         ind = find_element(parsed_query, "NOT")
@@ -135,9 +151,12 @@ def run_query(
 
 
 def boolean_search(query: str, inverted_index: InvertedIndex) -> list[int]:
-    parsed_query = parse_query(query)
-    results_set = run_query(parsed_query, inverted_index)
-    return sorted(results_set)
+    metrics.increment("search_queries")
+    with metrics.timer("search_parse_seconds"):
+        parsed_query = parse_query(query)
+    with metrics.timer("search_eval_seconds"):
+        results_set = run_query(parsed_query, inverted_index)
+        return sorted(results_set)
 
 
 if __name__ == "__main__":
@@ -152,6 +171,7 @@ if __name__ == "__main__":
         exit(1)
 
     inverted_index = load_inverted_index(inverted_index_file)
+    prewarm_in_background()
     print("Enter search query, e.g. `Матрица AND группа`")
     print("To quit, enter `exit`")
     print("If you want to search a page with word exit, use parentheses: `(exit)`")
@@ -2,16 +2,19 @@ from typing import Callable
 import os
 import sys
 
+from utils import lemmatize_term, prewarm_in_background
 from inverted_index import InvertedIndex, load_inverted_index
-from utils import lemmatize_term
+import metrics
 
 
 def create_term_expression(term: str, inverted_index: InvertedIndex) -> Callable:
     lemma = lemmatize_term(term)
+    documents = inverted_index.mapping.get(lemma, set())
+    metrics.increment("search_postings_touched", len(documents))
 
     def f(page_id):
         # print(lemma)
-        return page_id in inverted_index.mapping[lemma]
+        return page_id in documents
 
     return f
     # return lambda page_id: page_id in inverted_index.mapping[lemma]
@@ -145,9 +148,12 @@ def parse_query(query: str, inverted_index: InvertedIndex) -> list[Callable]:
 
 
 def boolean_search(query: str, inverted_index: InvertedIndex) -> list[int]:
-    predicate = parse_query(query, inverted_index)
-    all_pages = list(inverted_index.all_documents)
-    return list(filter(predicate, all_pages))
+    metrics.increment("search_queries")
+    with metrics.timer("search_parse_seconds"):
+        predicate = parse_query(query, inverted_index)
+    with metrics.timer("search_eval_seconds"):
+        all_pages = list(inverted_index.all_documents)
+        return list(filter(predicate, all_pages))
 
 
 if __name__ == "__main__":
@@ -162,6 +168,7 @@ if __name__ == "__main__":
         exit(1)
 
     inverted_index = load_inverted_index(inverted_index_file)
+    prewarm_in_background()
     print("Enter search query, e.g. `Матрица AND группа`")
     print("To quit, enter `exit`")
     print("If you want to search a page with word exit, use parentheses: `(exit)`")
@@ -0,0 +1,129 @@
+from heapq import merge
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+import os
+import sys
+
+from utils import prewarm
+from inverted_index import get_shard_paths, load_inverted_index
+import metrics
+from search import lemmatize_query, parse_query, run_query
+
+
+def shard_worker(shard_path: str, connection: Connection) -> None:
+    """
+    Worker process: loads its shard once and answers parsed and lemmatized
+    queries until it receives None. Every answer is sent
+    together with metrics recorded since the previous one
+    """
+    inverted_index = load_inverted_index(shard_path)
+    while True:
+        parsed_query = connection.recv()
+        if parsed_query is None:
+            break
+        try:
+            with metrics.timer("search_shard_eval_seconds"):
+                result = sorted(run_query(parsed_query, inverted_index, lemmatized=True))
+        except Exception as e:
+            result = e
+        connection.send((result, metrics.collect()))
+    connection.close()
+
+
+class ShardCoordinator:
+    """
+    Scatter-gather over shard worker processes:
+    query is parsed and lemmatized once, sent to every shard and results are merged
+    """
+
+    def __init__(self, shards_directory: str):
+        self.shard_paths = get_shard_paths(shards_directory)
+        if not self.shard_paths:
+            raise ValueError(f"No shards found in {shards_directory}")
+        self.connections: list[Connection] = []
+        self.processes: list[Process] = []
+
+    def start(self) -> None:
+        # the coordinator lemmatizes queries, load pymorphy2 before the first one
+        prewarm()
+        for shard_path in self.shard_paths:
+            parent_connection, child_connection = Pipe()
+            process = Process(
+                target=shard_worker,
+                args=(shard_path, child_connection),
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+
+    def close(self) -> None:
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self) -> "ShardCoordinator":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def boolean_search(self, query: str) -> list[int]:
+        with metrics.timer("search_sharded_seconds"):
+            return self._boolean_search(query)
+
+    def _boolean_search(self, query: str) -> list[int]:
+        # lemmatize here, so pymorphy2 runs once per query and not once per shard
+        parsed_query = lemmatize_query(parse_query(query))
+        # scatter: all shards work on the query at the same time
+        for connection in self.connections:
+            connection.send(parsed_query)
+
+        # gather: results of every shard are already sorted
+        shard_results = []
+        error = None
+        for shard, connection in enumerate(self.connections):
+            result, worker_metrics = connection.recv()
+            metrics.merge(worker_metrics, shard=shard)
+            if isinstance(result, Exception):
+                error = result
+                continue
+            shard_results.append(result)
+        if error is not None:
+            raise error
+        return list(merge(*shard_results))
+
+
+if __name__ == "__main__":
+    shards_directory = "results/shards"
+    if len(sys.argv) == 1:
+        pass
+    elif len(sys.argv) == 2:
+        shards_directory = sys.argv[1]
+    else:
+        print("Error, too many args")
+        exit(1)
+
+    if not os.path.isdir(shards_directory):
+        print(f"Error, no shards directory {shards_directory}")
+        exit(1)
+
+    with ShardCoordinator(shards_directory) as coordinator:
+        print(f"Loaded {len(coordinator.shard_paths)} shards")
+        print("Enter search query, e.g. `Матрица AND группа`")
+        print("To quit, enter `exit`")
+        print("If you want to search a page with word exit, use parentheses: `(exit)`")
+        while True:
+            query = input("Query: ")
+            if query == "exit":
+                break
+            print(coordinator.boolean_search(query))
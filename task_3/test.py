@@ -1,10 +1,24 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
 import os
+import random
+import subprocess
 import sys
+import tempfile
+import threading
+import time
 from typing import Callable
 
-from inverted_index import load_inverted_index, InvertedIndex
+from inverted_index import (
+    load_inverted_index,
+    InvertedIndex,
+    shard_inverted_index,
+    save_sharded_inverted_index,
+)
 from search import boolean_search as boolean_search_main
 from search_predicates import boolean_search as boolean_search_predicates
+from sharded_search import ShardCoordinator
+from utils import lemmatize_term
+import pipeline
 
 
 def test_case_1(inverted_index: InvertedIndex, document_lemmas: dict[int, list[str]]):
@@ -97,6 +111,195 @@ def test_case_4(inverted_index: InvertedIndex, document_lemmas: dict[int, list[s
     print("*****")
 
 
+SAMPLE_TERMS = [
+    "дифференциальный",
+    "интегральное",
+    "уравнение",
+    "поле",
+    "группа",
+    "кольцо",
+    "матрица",
+    "базис",
+    "галуа",
+    "механика",
+    "математики",
+    "европы",
+]
+
+
+def create_sample_index(num_documents: int = 60) -> InvertedIndex:
+    """Small random index over the terms of sharded queries, needs no crawl"""
+    rng = random.Random(0)
+    inverted_index = InvertedIndex(mapping={}, all_documents=set())
+    for document_id in range(num_documents):
+        terms = rng.sample(SAMPLE_TERMS, 5)
+        inverted_index.add_document(document_id, {lemmatize_term(t) for t in terms})
+    return inverted_index
+
+
+def test_case_sharded(inverted_index: InvertedIndex, num_shards: int = 3):
+    queries = [
+        "NOT (дифференциальный OR Интегральное) AND уравнение",
+        "(поле OR группы OR кольца) AND (матрицы OR базисы) AND NOT галуа",
+        "NOT NOT (NOT (NOT механика))",
+        "Математики AND NOT Европы",
+    ]
+    print("*****")
+    print(f"Testing sharded search with {num_shards} shards")
+    with tempfile.TemporaryDirectory() as shards_directory:
+        shards = shard_inverted_index(inverted_index, num_shards)
+        save_sharded_inverted_index(shards, shards_directory)
+        with ShardCoordinator(shards_directory) as coordinator:
+            for query in queries:
+                results_main = boolean_search_main(query, inverted_index)
+                results_sharded = coordinator.boolean_search(query)
+                assert (
+                    results_main == results_sharded
+                ), f"Sharded results differ for query: {query}"
+
+    print("Test case sharded is successful")
+    print("*****")
+
+
+IMPORT_TIME_SCRIPT = """
+import sys
+import time
+
+start = time.perf_counter()
+import inverted_index, search, search_predicates, sharded_search, create_tokens
+print(time.perf_counter() - start)
+print(",".join(m for m in ["nltk", "pymorphy2"] if m in sys.modules))
+"""
+
+
+def test_case_import_time(max_seconds: float = 1.0):
+    print("*****")
+    print("Testing import time of search and tokenizer modules")
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_TIME_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout.splitlines()
+    import_time, heavy_modules = float(output[0]), output[1]
+    print(f"Import time: {import_time:.3f} s")
+    assert heavy_modules == "", f"Loaded at import time: {heavy_modules}"
+    assert import_time < max_seconds, f"Import took {import_time:.3f} s"
+
+    print("Test case import time is successful")
+    print("*****")
+
+
+PIPELINE_WORDS = [
+    "группа", "кольцо", "поле", "базис", "вектор", "граф", "дерево", "функция",
+    "множество", "отображение", "уравнение", "решение", "пространство", "элемент",
+    "порядок", "число", "система", "теорема", "доказательство", "свойство",
+]
+
+
+def create_pipeline_stub_server(crash_page: int = -1) -> HTTPServer:
+    """Page n links to pages 2n+1 and 2n+2, every page mentions матрицы"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = int(self.path.rsplit("/", 1)[1])
+            rng = random.Random(page)
+            words = [rng.choice(PIPELINE_WORDS) for _ in range(60)] + ["матрицы"]
+            if page == crash_page:
+                words.append("крах")
+            links = "".join(
+                f'<a href="/wiki/{child}">ссылка</a>'
+                for child in (2 * page + 1, 2 * page + 2)
+            )
+            body = (
+                f'<html><body><div id="bodyContent"><p>{" ".join(words)}</p>'
+                f"{links}</div></body></html>"
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_case_pipeline(max_pages: int = 15):
+    print("*****")
+    print("Testing streaming pipeline against a stub server")
+    server = create_pipeline_stub_server()
+    starting_url = f"http://127.0.0.1:{server.server_address[1]}/wiki/0"
+    with tempfile.TemporaryDirectory() as directory:
+        inverted_index = pipeline.run_pipeline(
+            starting_url,
+            max_pages,
+            results_directory=directory,
+            tokenize_workers=2,
+            sleep_time=0,
+            checkpoint_every=5,
+        )
+        assert inverted_index.all_documents == set(range(max_pages))
+        results = boolean_search_main("матрица", inverted_index)
+        assert results == list(range(max_pages)), f"Wrong results: {results}"
+
+        saved_index = load_inverted_index(
+            os.path.join(directory, "inverted_index.json")
+        )
+        assert saved_index.all_documents == inverted_index.all_documents
+        with open(os.path.join(directory, "index.txt"), "r") as f:
+            assert len(f.readlines()) == max_pages
+    server.shutdown()
+
+    print("Test case pipeline is successful")
+    print("*****")
+
+
+def test_case_pipeline_worker_crash(timeout: float = 30):
+    if pipeline.START_METHOD != "fork":
+        print("Skipping pipeline crash test: needs fork start method")
+        return
+    print("*****")
+    print("Testing that pipeline fails when a tokenizer process dies")
+    server = create_pipeline_stub_server(crash_page=3)
+    starting_url = f"http://127.0.0.1:{server.server_address[1]}/wiki/0"
+    tokenize_text = pipeline.tokenize_text
+
+    # forked tokenizers inherit the patched function
+    def crashing_tokenize_text(text, stop_words, morph):
+        if "крах" in text:
+            os._exit(1)
+        return tokenize_text(text, stop_words, morph)
+
+    pipeline.tokenize_text = crashing_tokenize_text
+    start = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            pipeline.run_pipeline(
+                starting_url,
+                15,
+                results_directory=directory,
+                tokenize_workers=2,
+                sleep_time=0,
+            )
+        raise AssertionError("Pipeline finished although a tokenizer died")
+    except pipeline.WorkerError as e:
+        print(f"Pipeline failed as expected: {e}")
+    finally:
+        pipeline.tokenize_text = tokenize_text
+        server.shutdown()
+    elapsed = time.perf_counter() - start
+    assert elapsed < timeout, f"Pipeline noticed the dead worker after {elapsed:.1f} s"
+
+    print("Test case pipeline worker crash is successful")
+    print("*****")
+
+
 if __name__ == "__main__":
     inverted_index_file = "results/inverted_index.json"
     lemma_directory = "../task_2/results"
@@ -110,6 +313,16 @@ if __name__ == "__main__":
     else:
         print("Error, too many args")
         exit(1)
+
+    # these tests need no crawled data
+    test_case_import_time()
+    test_case_sharded(create_sample_index())
+    test_case_pipeline()
+    test_case_pipeline_worker_crash()
+
+    if not os.path.exists(inverted_index_file):
+        print(f"Skipping tests on crawled data: no index {inverted_index_file}")
+        exit(0)
     inverted_index = load_inverted_index(inverted_index_file)
 
     document_lemmas = {}
@@ -130,3 +343,4 @@ if __name__ == "__main__":
     test_case_2(inverted_index, document_lemmas)
     test_case_3(inverted_index, document_lemmas)
     test_case_4(inverted_index, document_lemmas)
+    test_case_sharded(inverted_index)
@@ -1,8 +1,51 @@
 from typing import Any
+import os
+import sys
+import threading
 
-import pymorphy2
+# Modules of task_1 (crawler, page store, metrics) and task_2 (tokenizer)
+# are imported by task_3. This is the only place where task_3 adds them
+# to sys.path, other modules import utils first
+for task in ["task_1", "task_2"]:
+    task_directory = os.path.normpath(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", task)
+    )
+    if task_directory not in sys.path:
+        sys.path.append(task_directory)
 
-morph = pymorphy2.MorphAnalyzer()
+import metrics
+
+_morph = None
+_morph_lock = threading.Lock()
+# term -> lemma, queries repeat the same terms
+_lemma_cache: dict[str, str] = {}
+
+
+def get_morph():
+    """
+    pymorphy2 dictionaries take seconds to load, so they are loaded on first use.
+    Call `prewarm` before forking workers to share one loaded copy between them
+    """
+    global _morph
+    if _morph is None:
+        # the first query waits for a load started by `prewarm_in_background`
+        with _morph_lock:
+            if _morph is None:
+                import pymorphy2
+
+                _morph = pymorphy2.MorphAnalyzer()
+    return _morph
+
+
+def prewarm() -> None:
+    get_morph()
+
+
+def prewarm_in_background() -> threading.Thread:
+    """Load dictionaries while the user types the first query"""
+    thread = threading.Thread(target=prewarm, daemon=True)
+    thread.start()
+    return thread
 
 
 def find_element(lst: list, elem: Any) -> int:
@@ -13,4 +56,11 @@ def find_element(lst: list, elem: Any) -> int:
 
 
 def lemmatize_term(term: str) -> str:
-    return morph.parse(term.lower())[0].normal_form
+    lemma = _lemma_cache.get(term)
+    if lemma is not None:
+        metrics.increment("search_lemma_cache_hits")
+        return lemma
+    metrics.increment("search_lemma_cache_misses")
+    lemma = get_morph().parse(term.lower())[0].normal_form
+    _lemma_cache[term] = lemma
+    return lemma